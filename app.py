@@ -2,8 +2,13 @@
 Flask web app for DR question data annotation.
 Uses SQLite (persistent) when data/annotations.db exists, else Excel.
 """
+import atexit
+import functools
 import os
+import queue
 import re
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
 import pandas as pd
@@ -50,14 +55,41 @@ BUNDLED_EXCEL = APP_DIR / "data" / "dr_questions.xlsx"
 
 app = Flask(__name__, template_folder="templates", static_folder="static")
 
+# orjson serializes the large /api/questions payload several times faster
+# than stdlib json; keep Flask's default provider when it isn't installed.
+try:
+    import orjson
+    from flask.json.provider import DefaultJSONProvider
 
+    class _ORJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = _ORJSONProvider(app)
+except ImportError:
+    pass
+
+
+class TaskNotFoundError(Exception):
+    """Raised when an annotation references a task_id not in questions."""
+
+
+# Precompiled: called on every request, often twice.
+_SANITIZE_STRIP_RE = re.compile(r"[^\w\s-]")
+_SANITIZE_SEP_RE = re.compile(r"[-\s]+")
+
+
+@functools.lru_cache(maxsize=256)
 def _sanitize_annotator_id(name: str) -> str:
     """Normalized annotator id (case-insensitive)."""
     if not name or not name.strip():
         return ""
     s = name.strip()
-    s = re.sub(r"[^\w\s-]", "", s)
-    s = re.sub(r"[-\s]+", "_", s).strip("_").lower()
+    s = _SANITIZE_STRIP_RE.sub("", s)
+    s = _SANITIZE_SEP_RE.sub("_", s).strip("_").lower()
     return f"Annotator_{s}" if s else ""
 
 
@@ -66,10 +98,87 @@ def _use_sqlite() -> bool:
     return DB_PATH.exists() or os.environ.get("ANNOTATION_DB") is not None
 
 
+# Per-connection PRAGMAs: WAL lets readers run concurrently with the single
+# writer, synchronous=NORMAL is safe under WAL, busy_timeout avoids
+# "database is locked" errors under Flask's threaded server.
+_CONNECTION_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA busy_timeout=30000;
+    PRAGMA cache_size=-65536;
+    PRAGMA foreign_keys=ON;
+    PRAGMA temp_store=MEMORY;
+"""
+
+
+def _configure_connection(conn):
+    """Apply the tuned PRAGMAs to a fresh connection (skipped for in-memory DBs)."""
+    if str(DB_PATH) != ":memory:":
+        conn.executescript(_CONNECTION_PRAGMAS)
+    return conn
+
+
 def _get_db():
     import sqlite3
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    return sqlite3.connect(str(DB_PATH))
+    conn = sqlite3.connect(str(DB_PATH), timeout=30, isolation_level=None, check_same_thread=False)
+    return _configure_connection(conn)
+
+
+# Connection pool: one dedicated writer connection (SQLite allows a single
+# writer at a time anyway) plus a small pool of reader connections. WAL lets
+# the readers run concurrently with the writer, and reusing connections keeps
+# each one's page cache warm between requests.
+_READER_POOL_SIZE = 8
+_WRITER_CONN = None
+_WRITER_LOCK = threading.Lock()
+_READER_POOL: "queue.Queue | None" = None
+_POOL_INIT_LOCK = threading.Lock()
+
+
+def _close_pools() -> None:
+    global _WRITER_CONN, _READER_POOL
+    if _WRITER_CONN is not None:
+        _WRITER_CONN.close()
+        _WRITER_CONN = None
+    if _READER_POOL is not None:
+        while not _READER_POOL.empty():
+            _READER_POOL.get_nowait().close()
+        _READER_POOL = None
+
+
+def _init_pools() -> None:
+    global _WRITER_CONN, _READER_POOL
+    with _POOL_INIT_LOCK:
+        if _READER_POOL is not None:
+            return
+        _WRITER_CONN = _get_db()
+        pool = queue.Queue(maxsize=_READER_POOL_SIZE)
+        for _ in range(_READER_POOL_SIZE):
+            pool.put(_get_db())
+        _READER_POOL = pool
+        atexit.register(_close_pools)
+
+
+@contextmanager
+def _reader():
+    """Borrow a reader connection from the pool."""
+    if _READER_POOL is None:
+        _init_pools()
+    conn = _READER_POOL.get()
+    try:
+        yield conn
+    finally:
+        _READER_POOL.put(conn)
+
+
+@contextmanager
+def _writer():
+    """Exclusive access to the shared writer connection."""
+    if _WRITER_CONN is None:
+        _init_pools()
+    with _WRITER_LOCK:
+        yield _WRITER_CONN
 
 
 def _build_questions_ddl() -> str:
@@ -93,17 +202,59 @@ def _migrate_add_columns(conn) -> None:
     """Add any new columns that don't exist yet (for existing DBs with the old 3-column schema)."""
     cur = conn.execute("PRAGMA table_info(questions)")
     existing_cols = {row[1] for row in cur.fetchall()}
-    for col in QUESTION_COLUMNS:
-        if col not in existing_cols:
-            conn.execute(f"ALTER TABLE questions ADD COLUMN {col} TEXT DEFAULT ''")
-    conn.commit()
+    missing = [c for c in QUESTION_COLUMNS if c not in existing_cols]
+    if not missing:
+        return
+    # Batch all ALTERs into one script/transaction; each one rewrites
+    # sqlite_schema, so avoid a statement + commit per column.
+    conn.executescript(
+        "BEGIN;"
+        + "".join(f"ALTER TABLE questions ADD COLUMN {c} TEXT DEFAULT '';" for c in missing)
+        + "COMMIT;"
+    )
+
+
+def _excel_seed_rows(path: Path) -> tuple:
+    """Columns present in the Excel plus an iterable of cleaned row tuples.
+
+    Prefers the Rust-backed calamine engine when python-calamine is installed;
+    otherwise streams rows through openpyxl's read-only mode so the workbook
+    is never fully materialized in memory.
+    """
+    try:
+        # dtype=str + keep_default_na=False: every cell arrives as a string
+        # ("" for blanks), so no per-cell notna/str conversion is needed.
+        df = pd.read_excel(
+            path, sheet_name=SHEET_NAME, engine="calamine",
+            dtype=str, keep_default_na=False,
+        )
+    except ImportError:
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True, data_only=True)
+        ws = wb[SHEET_NAME]
+        rows_iter = ws.iter_rows(values_only=True)
+        header = ["" if c is None else str(c).strip() for c in next(rows_iter)]
+        available_cols = [c for c in QUESTION_COLUMNS if c in header]
+        idx = [header.index(c) for c in available_cols]
+
+        def rows():
+            try:
+                for r in rows_iter:
+                    yield tuple("" if r[i] is None else str(r[i]).strip() for i in idx)
+            finally:
+                wb.close()
+
+        return available_cols, rows()
+    available_cols = [c for c in QUESTION_COLUMNS if c in df.columns]
+    clean = df[available_cols].apply(lambda c: c.str.strip())
+    return available_cols, clean.itertuples(index=False, name=None)
 
 
 def _ensure_sqlite_seeded() -> None:
     """If DB has no questions, create schema and seed from bundled Excel (for Railway etc.)."""
     import sqlite3
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = _configure_connection(sqlite3.connect(str(DB_PATH), timeout=30, isolation_level=None))
     try:
         questions_ddl = _build_questions_ddl()
         conn.executescript(f"""
@@ -116,45 +267,87 @@ def _ensure_sqlite_seeded() -> None:
                 CHECK (value IN (-1, 0, 1)),
                 FOREIGN KEY (task_id) REFERENCES questions(task_id)
             );
-            CREATE INDEX IF NOT EXISTS idx_annotations_annotator ON annotations(annotator_id);
+            -- The (annotator_id, task_id) PRIMARY KEY already covers annotator
+            -- lookups; index task_id for per-task joins (export pivot, FK checks).
+            DROP INDEX IF EXISTS idx_annotations_annotator;
+            CREATE INDEX IF NOT EXISTS idx_annotations_task_id ON annotations(task_id);
         """)
         conn.commit()
         _migrate_add_columns(conn)
         row = conn.execute("SELECT COUNT(*) FROM questions").fetchone()
         if row and row[0] == 0 and BUNDLED_EXCEL.exists():
-            import pandas as _pd
-            df = _pd.read_excel(BUNDLED_EXCEL, engine="openpyxl", sheet_name=SHEET_NAME)
-            available_cols = [c for c in QUESTION_COLUMNS if c in df.columns]
+            available_cols, seed_rows = _excel_seed_rows(BUNDLED_EXCEL)
             placeholders = ", ".join("?" for _ in available_cols)
             col_names = ", ".join(available_cols)
             sql = f"INSERT OR REPLACE INTO questions ({col_names}) VALUES ({placeholders})"
-            for _, r in df.iterrows():
-                values = []
-                for col in available_cols:
-                    val = r[col]
-                    if _pd.notna(val):
-                        values.append(str(val).strip())
-                    else:
-                        values.append("")
-                conn.execute(sql, values)
-            conn.commit()
+            # One executemany inside a single transaction: SQLite reuses the
+            # prepared statement and commits once. synchronous=OFF is safe
+            # here because seeding is idempotent — a crash mid-seed just
+            # re-runs from the bundled Excel.
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(sql, seed_rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.execute("PRAGMA synchronous=NORMAL")
     finally:
         conn.close()
 
 
-def _questions_from_sqlite() -> list[dict]:
-    """Return all questions with ALL columns from SQLite."""
-    col_list = ", ".join(QUESTION_COLUMNS)
-    with _get_db() as conn:
-        conn.row_factory = lambda c, r: dict(zip([x[0] for x in c.description], r))
+def _questions_from_sqlite() -> list[tuple]:
+    """(task_id, domain, dr_question, user_role, user_role_description) tuples.
+
+    Only the columns /api/questions serves — no row_factory, no per-row dict.
+    export_excel queries all columns itself.
+    """
+    with _reader() as conn:
         cur = conn.execute(
-            f"SELECT {col_list} FROM questions ORDER BY task_id"
+            "SELECT task_id, domain, dr_question, user_role, user_role_description"
+            " FROM questions ORDER BY task_id"
         )
-        return [dict(row) for row in cur.fetchall()]
+        return cur.fetchall()
+
+
+# Questions are effectively read-only after seeding, so cache the rows served
+# by /api/questions (everything except the per-user annotation) and rebuild
+# only when the DB file changes on disk.
+_QUESTIONS_CACHE = {"mtime": None, "rows": None}
+_QUESTIONS_CACHE_LOCK = threading.Lock()
+
+
+def _cached_question_rows() -> list[dict]:
+    """Per-question row dicts minus the per-user annotation, rebuilt on DB mtime change."""
+    try:
+        mtime = DB_PATH.stat().st_mtime_ns
+    except OSError:
+        mtime = None
+    if _QUESTIONS_CACHE["rows"] is not None and _QUESTIONS_CACHE["mtime"] == mtime:
+        return _QUESTIONS_CACHE["rows"]
+    with _QUESTIONS_CACHE_LOCK:
+        if _QUESTIONS_CACHE["rows"] is not None and _QUESTIONS_CACHE["mtime"] == mtime:
+            return _QUESTIONS_CACHE["rows"]
+        rows = []
+        for i, (task_id, domain, dr_question, role, desc) in enumerate(_questions_from_sqlite()):
+            rows.append({
+                "index": i,
+                "task_id": str(task_id),
+                "user_role_info": _combine_user_role_info(
+                    {"user_role": role, "user_role_description": desc}
+                ),
+                "domain": str(domain or ""),
+                "dr_question": str(dr_question or ""),
+            })
+        _QUESTIONS_CACHE["rows"] = rows
+        _QUESTIONS_CACHE["mtime"] = mtime
+        return rows
 
 
 def _annotation_from_sqlite(annotator_id: str, task_id: str) -> int:
-    with _get_db() as conn:
+    with _reader() as conn:
         row = conn.execute(
             "SELECT value FROM annotations WHERE annotator_id = ? AND task_id = ?",
             (annotator_id, task_id),
@@ -163,7 +356,7 @@ def _annotation_from_sqlite(annotator_id: str, task_id: str) -> int:
 
 
 def _annotations_for_annotator_sqlite(annotator_id: str) -> dict[str, int]:
-    with _get_db() as conn:
+    with _reader() as conn:
         cur = conn.execute(
             "SELECT task_id, value FROM annotations WHERE annotator_id = ?",
             (annotator_id,),
@@ -171,22 +364,64 @@ def _annotations_for_annotator_sqlite(annotator_id: str) -> dict[str, int]:
         return {row[0]: int(row[1]) for row in cur.fetchall()}
 
 
-def _set_annotation_sqlite(annotator_id: str, task_id: str, value: int) -> None:
-    with _get_db() as conn:
-        conn.execute(
-            """INSERT INTO annotations (annotator_id, task_id, value) VALUES (?, ?, ?)
-               ON CONFLICT (annotator_id, task_id) DO UPDATE SET value = ?""",
-            (annotator_id, task_id, value, value),
+def _annotations_for_tasks_sqlite(annotator_id: str, task_ids: list[str]) -> dict[str, int]:
+    """Annotations for one annotator restricted to the given page of task_ids."""
+    if not task_ids:
+        return {}
+    placeholders = ", ".join("?" for _ in task_ids)
+    with _reader() as conn:
+        cur = conn.execute(
+            f"SELECT task_id, value FROM annotations"
+            f" WHERE annotator_id = ? AND task_id IN ({placeholders})",
+            [annotator_id, *task_ids],
         )
-        conn.commit()
+        return {row[0]: int(row[1]) for row in cur.fetchall()}
 
 
-def _task_exists_sqlite(task_id: str) -> bool:
-    with _get_db() as conn:
-        row = conn.execute(
-            "SELECT 1 FROM questions WHERE task_id = ?", (str(task_id),)
-        ).fetchone()
-        return row is not None
+def _set_annotation_sqlite(annotator_id: str, task_id: str, value: int) -> None:
+    """Upsert one annotation; raises TaskNotFoundError for an unknown task_id.
+
+    The foreign key on annotations(task_id) does the existence check inside
+    the same statement, so no separate SELECT round-trip is needed.
+    """
+    import sqlite3
+    with _writer() as conn:
+        # The writer connection runs in autocommit (isolation_level=None), so
+        # this single upsert is already its own atomic transaction: SQLite
+        # wraps it in an implicit BEGIN/COMMIT with no extra round trips, and
+        # a one-statement write can't hit a lock-upgrade deadlock.
+        try:
+            conn.execute(
+                """INSERT INTO annotations (annotator_id, task_id, value) VALUES (?, ?, ?)
+                   ON CONFLICT (annotator_id, task_id) DO UPDATE SET value = ?""",
+                (annotator_id, task_id, value, value),
+            )
+        except sqlite3.IntegrityError:
+            raise TaskNotFoundError(task_id)
+
+
+# Seeding is idempotent but not free (DDL parse, table_info scan, COUNT);
+# run it once per process and skip it on every later request.
+_SEEDED = False
+_SEED_LOCK = threading.Lock()
+
+
+def _seed_once() -> None:
+    global _SEEDED
+    if _SEEDED:
+        return
+    with _SEED_LOCK:
+        if not _SEEDED:
+            _ensure_sqlite_seeded()
+            _SEEDED = True
+
+
+# Seed eagerly at import so the first request isn't penalized.
+if _use_sqlite():
+    try:
+        _seed_once()
+    except Exception:
+        pass
 
 
 # ---- Excel path (legacy / local)
@@ -196,21 +431,65 @@ def _find_annotator_column(df: pd.DataFrame, name: str) -> str | None:
         return None
     if want in df.columns:
         return want
-    for col in df.columns:
-        if str(col).strip().lower() == want:
-            return col
-    return None
-
-
-def _load_df() -> pd.DataFrame:
+    # Case-insensitive lookup via the cached column index instead of a
+    # linear scan over df.columns on every request.
+    with _DF_CACHE_LOCK:
+        col_index = _DF_CACHE["col_index"]
+    if col_index is None:
+        col_index = {str(c).strip().lower(): c for c in df.columns}
+        with _DF_CACHE_LOCK:
+            _DF_CACHE["col_index"] = col_index
+    return col_index.get(want)
+
+
+# Parsed-Excel cache: re-reading the xlsx on every request is the dominant
+# cost of the Excel path, so keep the DataFrame keyed on the file's mtime.
+# "rows" holds the precomputed user-independent question rows (including the
+# combined user_role_info), rebuilt whenever the DataFrame is.
+_DF_CACHE = {"mtime": None, "df": None, "rows": None, "col_index": None}
+_DF_CACHE_LOCK = threading.Lock()
+
+
+def _load_df(for_update: bool = False) -> pd.DataFrame:
+    """Cached Excel read; for_update returns a private copy safe to mutate."""
     if not EXCEL_PATH.exists():
         raise FileNotFoundError(f"Excel file not found: {EXCEL_PATH}")
-    return pd.read_excel(EXCEL_PATH, engine="openpyxl", sheet_name=SHEET_NAME)
+    mtime = EXCEL_PATH.stat().st_mtime_ns
+    with _DF_CACHE_LOCK:
+        if _DF_CACHE["df"] is None or _DF_CACHE["mtime"] != mtime:
+            try:
+                df = pd.read_excel(EXCEL_PATH, engine="calamine", sheet_name=SHEET_NAME)
+            except ImportError:
+                df = pd.read_excel(EXCEL_PATH, engine="openpyxl", sheet_name=SHEET_NAME)
+            _DF_CACHE["df"] = df
+            _DF_CACHE["mtime"] = mtime
+            _DF_CACHE["rows"] = None
+            _DF_CACHE["col_index"] = {str(c).strip().lower(): c for c in df.columns}
+        df = _DF_CACHE["df"]
+    return df.copy() if for_update else df
+
+
+def _write_excel(df: pd.DataFrame, target) -> None:
+    """Write df to a path or buffer, preferring the faster xlsxwriter engine.
+
+    Note: xlsxwriter's constant_memory mode is not used because pandas does
+    not emit cells in strict row order, which that mode requires.
+    """
+    try:
+        with pd.ExcelWriter(target, engine="xlsxwriter") as writer:
+            df.to_excel(writer, index=False, sheet_name=SHEET_NAME)
+    except ImportError:
+        df.to_excel(target, index=False, engine="openpyxl", sheet_name=SHEET_NAME)
 
 
 def _save_df(df: pd.DataFrame) -> None:
     EXCEL_PATH.parent.mkdir(parents=True, exist_ok=True)
-    df.to_excel(EXCEL_PATH, index=False, engine="openpyxl", sheet_name=SHEET_NAME)
+    _write_excel(df, EXCEL_PATH)
+    with _DF_CACHE_LOCK:
+        _DF_CACHE["df"] = None
+        _DF_CACHE["mtime"] = None
+        _DF_CACHE["rows"] = None
+        _DF_CACHE["col_index"] = None
 
 
 def _combine_user_role_info(q: dict) -> str:
@@ -222,6 +501,36 @@ def _combine_user_role_info(q: dict) -> str:
     return role or desc or ""
 
 
+def _excel_base_rows(df: pd.DataFrame) -> list[dict]:
+    """User-independent question rows for the Excel path, computed once per load.
+
+    Column-wise extraction instead of iterrows(): pandas does the string
+    conversion and NA handling in C rather than per-row Python.
+    """
+    def _stripped(name: str) -> pd.Series:
+        if name in df.columns:
+            return df[name].where(df[name].notna(), "").astype(str).str.strip()
+        return pd.Series("", index=df.index, dtype=str)
+
+    role = _stripped("user_role")
+    desc = _stripped("user_role_description")
+    role_info = (role + " — " + desc).where((role != "") & (desc != ""), role.where(role != "", desc))
+
+    task_ids = df["task_id"].astype(str).tolist()
+    domains = df["domain"].astype(str).tolist()
+    dr_questions = df["dr_question"].astype(str).tolist()
+    return [
+        {
+            "index": i,
+            "task_id": t,
+            "user_role_info": u,
+            "domain": d,
+            "dr_question": q,
+        }
+        for i, (t, u, d, q) in enumerate(zip(task_ids, role_info.tolist(), domains, dr_questions))
+    ]
+
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -230,26 +539,37 @@ def index():
 @app.route("/api/questions", methods=["GET"])
 def get_questions():
     user = request.args.get("user", "").strip()
+    # Optional pagination: ?limit=&offset= bounds both the JSON payload and
+    # the annotation fetch; limit=0 (the default) returns everything.
+    try:
+        limit = int(request.args.get("limit", 0))
+        offset = int(request.args.get("offset", 0))
+    except (TypeError, ValueError):
+        limit, offset = 0, 0
+    offset = max(offset, 0)
     if _use_sqlite():
         try:
-            _ensure_sqlite_seeded()
-            questions = _questions_from_sqlite()
+            _seed_once()
+            base_rows = _cached_question_rows()
         except Exception as e:
             return jsonify({"error": str(e)}), 500
+        total = len(base_rows)
+        if limit > 0:
+            base_rows = base_rows[offset:offset + limit]
         annotator_id = _sanitize_annotator_id(user) if user else None
-        annotations = _annotations_for_annotator_sqlite(annotator_id) if annotator_id else {}
-        rows = []
-        for i, q in enumerate(questions):
-            task_id = str(q["task_id"])
-            rows.append({
-                "index": i,
-                "task_id": task_id,
-                "user_role_info": _combine_user_role_info(q),
-                "domain": str(q.get("domain", "")),
-                "dr_question": str(q.get("dr_question", "")),
-                "annotation": annotations.get(task_id, 0),
-            })
-        return jsonify({"questions": rows, "annotator_column": annotator_id})
+        if not annotator_id:
+            annotations = {}
+        elif limit > 0:
+            annotations = _annotations_for_tasks_sqlite(
+                annotator_id, [q["task_id"] for q in base_rows]
+            )
+        else:
+            annotations = _annotations_for_annotator_sqlite(annotator_id)
+        rows = [
+            {**q, "annotation": annotations.get(q["task_id"], 0)}
+            for q in base_rows
+        ]
+        return jsonify({"questions": rows, "annotator_column": annotator_id, "total": total})
     # Excel
     try:
         df = _load_df()
@@ -259,29 +579,23 @@ def get_questions():
         if col not in df.columns:
             return jsonify({"error": f"Missing column: {col}"}), 500
     annot_col = _find_annotator_column(df, user) if user else None
-    rows = []
-    for i, row in df.iterrows():
-        q = row.to_dict()
-        item = {
-            "index": int(i),
-            "task_id": str(q.get("task_id", "")),
-            "user_role_info": _combine_user_role_info(q),
-            "domain": str(q.get("domain", "")),
-            "dr_question": str(q.get("dr_question", "")),
-        }
-        if annot_col:
-            val = row.get(annot_col)
-            if pd.isna(val):
-                item["annotation"] = 0
-            else:
-                try:
-                    item["annotation"] = int(float(val))
-                except (TypeError, ValueError):
-                    item["annotation"] = 0
-        else:
-            item["annotation"] = 0
-        rows.append(item)
-    return jsonify({"questions": rows, "annotator_column": annot_col or None})
+    with _DF_CACHE_LOCK:
+        base_rows = _DF_CACHE["rows"]
+    if base_rows is None:
+        base_rows = _excel_base_rows(df)
+        with _DF_CACHE_LOCK:
+            _DF_CACHE["rows"] = base_rows
+    total = len(base_rows)
+    if limit > 0:
+        base_rows = base_rows[offset:offset + limit]
+    if annot_col:
+        ann_series = pd.to_numeric(df[annot_col], errors="coerce").fillna(0).astype(int)
+        if limit > 0:
+            ann_series = ann_series.iloc[offset:offset + limit]
+        rows = [{**q, "annotation": a} for q, a in zip(base_rows, ann_series.tolist())]
+    else:
+        rows = [{**q, "annotation": 0} for q in base_rows]
+    return jsonify({"questions": rows, "annotator_column": annot_col or None, "total": total})
 
 
 @app.route("/api/annotate", methods=["POST"])
@@ -305,17 +619,17 @@ def annotate():
         return jsonify({"error": "invalid user name"}), 400
 
     if _use_sqlite():
-        if not _task_exists_sqlite(task_id):
-            return jsonify({"error": f"task_id not found: {task_id}"}), 404
         try:
             _set_annotation_sqlite(annotator_id, str(task_id), value)
+        except TaskNotFoundError:
+            return jsonify({"error": f"task_id not found: {task_id}"}), 404
         except Exception as e:
             return jsonify({"error": str(e)}), 500
         return jsonify({"ok": True, "task_id": task_id, "value": value})
 
     # Excel
     try:
-        df = _load_df()
+        df = _load_df(for_update=True)
     except FileNotFoundError as e:
         return jsonify({"error": str(e)}), 404
     if "task_id" not in df.columns:
@@ -337,8 +651,8 @@ def export_excel():
     if not _use_sqlite():
         return jsonify({"error": "Export only available when using SQLite (e.g. on Railway)"}), 400
     import sqlite3
-    _ensure_sqlite_seeded()
-    conn = sqlite3.connect(str(DB_PATH))
+    _seed_once()
+    conn = _configure_connection(sqlite3.connect(str(DB_PATH), timeout=30, isolation_level=None))
     try:
         col_list = ", ".join(QUESTION_COLUMNS)
         questions = pd.read_sql_query(
@@ -347,21 +661,33 @@ def export_excel():
         )
         if questions.empty:
             return jsonify({"error": "No questions in database"}), 404
-        annotations = pd.read_sql_query(
-            "SELECT annotator_id, task_id, value FROM annotations",
-            conn,
-        )
+        # Build the wide annotator table in one SQL pass (one MAX(CASE ...)
+        # column per annotator) instead of loading all annotations and
+        # pivoting in pandas.
+        annotator_ids = [
+            r[0] for r in conn.execute(
+                "SELECT DISTINCT annotator_id FROM annotations ORDER BY annotator_id"
+            )
+        ]
+        wide = None
+        if annotator_ids:
+            select_cols = ", ".join(
+                'MAX(CASE WHEN annotator_id = ? THEN value END) AS "{}"'.format(aid.replace('"', '""'))
+                for aid in annotator_ids
+            )
+            wide = pd.read_sql_query(
+                f"SELECT task_id, {select_cols} FROM annotations GROUP BY task_id",
+                conn,
+                params=annotator_ids,
+            )
     finally:
         conn.close()
-    df = questions.copy()
-    if not annotations.empty:
-        pivot = annotations.pivot(
-            index="task_id", columns="annotator_id", values="value"
-        ).fillna(0).astype(int)
-        for col in pivot.columns:
-            df[col] = df["task_id"].map(pivot[col]).fillna(0).astype(int)
+    df = questions
+    if wide is not None:
+        df = questions.merge(wide, on="task_id", how="left")
+        df[annotator_ids] = df[annotator_ids].fillna(0).astype(int)
     buf = BytesIO()
-    df.to_excel(buf, index=False, engine="openpyxl", sheet_name=SHEET_NAME)
+    _write_excel(df, buf)
     buf.seek(0)
     return send_file(
         buf,
@@ -15,6 +15,7 @@ For the live Railway DB you cannot download the file directly; use the app's exp
 import argparse
 import os
 import sqlite3
+from collections import defaultdict
 from pathlib import Path
 
 import pandas as pd
@@ -77,22 +78,36 @@ def export_sqlite_to_excel(db_path: Path, output_path: Path) -> tuple[int, int]:
         if questions.empty:
             raise ValueError("No questions in database. Run upload_excel2sqlite.py first.")
 
-        annotations = pd.read_sql_query(
+        # Stream annotations in chunks and aggregate task_id -> {annotator: value};
+        # peak memory is one chunk instead of the full table plus a pivot buffer.
+        agg: dict[str, dict[str, int]] = defaultdict(dict)
+        for chunk in pd.read_sql_query(
             "SELECT annotator_id, task_id, value FROM annotations",
             conn,
-        )
+            chunksize=50_000,
+        ):
+            for aid, tid, val in zip(chunk["annotator_id"], chunk["task_id"], chunk["value"]):
+                agg[tid][aid] = val
     finally:
         conn.close()
 
-    # Pivot: one column per annotator_id, rows keyed by task_id
-    df = questions.copy()
-    if not annotations.empty:
-        pivot = annotations.pivot(index="task_id", columns="annotator_id", values="value").fillna(0).astype(int)
-        for col in pivot.columns:
-            df[col] = df["task_id"].map(pivot[col]).fillna(0).astype(int)
+    # One column per annotator_id, rows keyed by task_id
+    df = questions
+    if agg:
+        wide = pd.DataFrame.from_dict(agg, orient="index").fillna(0).astype(int)
+        wide.index.name = "task_id"
+        df = questions.merge(wide, left_on="task_id", right_index=True, how="left")
+        annot_cols = list(wide.columns)
+        df[annot_cols] = df[annot_cols].fillna(0).astype(int)
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    df.to_excel(output_path, index=False, engine="openpyxl", sheet_name=SHEET_NAME)
+    try:
+        # xlsxwriter writes several times faster than openpyxl; fall back to
+        # openpyxl if it isn't installed.
+        with pd.ExcelWriter(output_path, engine="xlsxwriter") as writer:
+            df.to_excel(writer, index=False, sheet_name=SHEET_NAME)
+    except ImportError:
+        df.to_excel(output_path, index=False, engine="openpyxl", sheet_name=SHEET_NAME)
     n_annotators = len(df.columns) - len(available_cols)
     return len(df), max(0, n_annotators)
 